@@ -1,188 +1,351 @@
 import streamlit as st
 import sqlite3
-from datetime import datetime
-try:
-    from streamlit_autorefresh import st_autorefresh
-except ImportError:
-    # Define a dummy function if the module is not found
-    def st_autorefresh(*args, **kwargs):
-        st.warning("`streamlit_autorefresh` not found. Auto-refresh will be disabled. Please install it with `pip install streamlit-autorefresh` if you need this feature.")
-        pass # Do nothing
-
-import pandas as pd
+import json
+import threading
+import queue
 from collections import defaultdict
+from contextlib import contextmanager
 
 # ================= CONFIG =================
 NUM_TABLES = 7
 DB_NAME = "restaurant.db"
+REFRESH_SECONDS = 5
+KITCHEN_ORDER_LIMIT = 100
+READ_POOL_SIZE = 4
+ACTIVE_STATUSES = ["Preparing", "Ready"]
+SECTION_EMOJIS = ["🔴", "🔵", "🟢", "🟡", "🟣", "🟠", "⚪", "⚫"]
+# Order row styles, sent once per page so each row only carries a short class name
+ORDER_CSS = """<style>
+.order-item {font-size:18px; font-weight:bold;}
+.order-meta {font-size:12px; color:grey;}
+.order-qty {text-align:center; font-size:18px; font-weight:bold;}
+.status-prep {color:orange; font-size:18px; font-weight:bold;}
+.status-ready {color:yellow; font-size:18px; font-weight:bold;}
+.status-served {color:lightgreen; font-size:18px; font-weight:bold;}
+.total {text-align:right;}
+</style>"""
 
 
 # ================= DB SETUP =================
-conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-cur = conn.cursor()
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS orders (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    table_id INTEGER,
-    section_id INTEGER,
-    item TEXT,
-    qty INTEGER,
-    status TEXT,
-    created_at TEXT,
-    price REAL,
-    is_parcel INTEGER DEFAULT 0
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS menu (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT UNIQUE NOT NULL,
-    price REAL NOT NULL
-)
-""")
-
-# Backwards compatibility for old databases - add missing columns
-cur.execute("PRAGMA table_info(orders)")
-columns = [row[1] for row in cur.fetchall()]
-if "price" not in columns:
-    cur.execute("ALTER TABLE orders ADD COLUMN price REAL DEFAULT 0")
-if "section_id" not in columns:
-    cur.execute("ALTER TABLE orders ADD COLUMN section_id INTEGER DEFAULT 1")
-if "is_parcel" not in columns:
-    cur.execute("ALTER TABLE orders ADD COLUMN is_parcel INTEGER DEFAULT 0")
-
-
-# One-time migration from hardcoded values to the database
-cur.execute("SELECT COUNT(*) FROM menu")
-if cur.fetchone()[0] == 0:
-    MIGRATION_MENU_ITEMS = [
-        "Porotta", "Dosa", "Idly", "Chaya", "Lime",
-        "Chicken Curry", "Beef Fry", "Vada", "Chappathi"
-    ]
-    MIGRATION_MENU_PRICES = {
-        "Porotta": 12, "Dosa": 40, "Idly": 30, "Chaya": 10, "Lime": 20,
-        "Chicken Curry": 150, "Beef Fry": 180, "Vada": 10, "Chappathi": 15
-    }
-    for item in MIGRATION_MENU_ITEMS:
-        if item: # Skip empty string
-            price = MIGRATION_MENU_PRICES.get(item, 0)
-            # Using INSERT OR IGNORE to be safe
-            cur.execute("INSERT OR IGNORE INTO menu (name, price) VALUES (?, ?)", (item, price))
-conn.commit()
+# Resources are built with show_spinner=False: they first run before st.set_page_config,
+# and a cache spinner would count as an earlier Streamlit element
+@st.cache_resource(show_spinner=False)
+def get_conn():
+    # The single writer connection, shared by all sessions and guarded by get_write_lock().
+    # Streamlit re-executes this script on every rerun, usually on a fresh thread, so the
+    # connection is kept in the resource cache to keep its page cache and mmap warm
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    # NORMAL sync avoids an fsync per commit and busy_timeout waits out a concurrent
+    # writer instead of failing with SQLITE_BUSY; these settings are per connection
+    for pragma in ("synchronous=NORMAL", "temp_store=MEMORY", "mmap_size=30000000", "cache_size=-64000", "busy_timeout=5000"):
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+@st.cache_resource(show_spinner=False)
+def get_write_lock():
+    return threading.Lock()
+
+@st.cache_resource(show_spinner=False)
+def _read_pool():
+    # A few long-lived read-only connections shared by all sessions. Reruns usually land on
+    # a fresh script thread, so per-thread connections would keep reopening with a cold cache
+    pool = queue.Queue()
+    for _ in range(READ_POOL_SIZE):
+        conn = sqlite3.connect(f"file:{DB_NAME}?mode=ro", uri=True, check_same_thread=False)
+        for pragma in ("temp_store=MEMORY", "mmap_size=30000000", "cache_size=-64000", "busy_timeout=5000"):
+            conn.execute(f"PRAGMA {pragma}")
+        pool.put(conn)
+    return pool
+
+@contextmanager
+def read_conn():
+    # Borrow a reader for the duration of the block; under WAL these read in parallel
+    # with the writer. Blocks while all of them are checked out
+    pool = _read_pool()
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        pool.put(conn)
+
+@st.cache_resource(show_spinner=False)
+def init_db():
+    # Schema, index and migration bookkeeping; Streamlit runs this once per server process
+    # instead of on every rerun
+    conn = get_conn()
+    cur = conn.cursor()
+
+    # WAL lets readers keep going while a write commits (persisted in the database file)
+    if cur.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+        cur.execute("PRAGMA journal_mode=WAL")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_id INTEGER,
+        section_id INTEGER,
+        item TEXT,
+        qty INTEGER,
+        status TEXT,
+        created_at TEXT DEFAULT (datetime('now', 'localtime')),
+        price REAL,
+        is_parcel INTEGER DEFAULT 0
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS menu (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        price REAL NOT NULL
+    )
+    """)
+
+    # Backwards compatibility for old databases - add missing columns
+    cur.execute("PRAGMA table_info(orders)")
+    columns = [row[1] for row in cur.fetchall()]
+    if "price" not in columns:
+        cur.execute("ALTER TABLE orders ADD COLUMN price REAL DEFAULT 0")
+    if "section_id" not in columns:
+        cur.execute("ALTER TABLE orders ADD COLUMN section_id INTEGER DEFAULT 1")
+    if "is_parcel" not in columns:
+        cur.execute("ALTER TABLE orders ADD COLUMN is_parcel INTEGER DEFAULT 0")
+
+    # Indexes for the Waiter (per table/section) and Kitchen (by status, newest first, by item) lookups
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_table_section ON orders(table_id, section_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_item ON orders(item)")
+    # Partial covering index for the Kitchen's default "active orders" query; stays small as Served rows pile up
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_active ON orders(created_at DESC, table_id, section_id, item, qty, status, is_parcel) WHERE status IN ('Preparing','Ready')")
+    cur.execute("DROP INDEX IF EXISTS idx_orders_status") # superseded by idx_orders_status_created
+    # Refresh planner statistics on every process start. Without stats on orders the planner
+    # never picks idx_orders_active; analysis_limit keeps this a quick sample on big tables
+    cur.execute("PRAGMA analysis_limit=1000")
+    cur.execute("ANALYZE")
+
+
+    # One-time migration from hardcoded values to the database
+    cur.execute("SELECT COUNT(*) FROM menu")
+    if cur.fetchone()[0] == 0:
+        MIGRATION_MENU_ITEMS = [
+            "Porotta", "Dosa", "Idly", "Chaya", "Lime",
+            "Chicken Curry", "Beef Fry", "Vada", "Chappathi"
+        ]
+        MIGRATION_MENU_PRICES = {
+            "Porotta": 12, "Dosa": 40, "Idly": 30, "Chaya": 10, "Lime": 20,
+            "Chicken Curry": 150, "Beef Fry": 180, "Vada": 10, "Chappathi": 15
+        }
+        # Using INSERT OR IGNORE to be safe; skip empty strings
+        cur.executemany(
+            "INSERT OR IGNORE INTO menu (name, price) VALUES (?, ?)",
+            [(item, MIGRATION_MENU_PRICES.get(item, 0)) for item in MIGRATION_MENU_ITEMS if item]
+        )
+    conn.commit()
+
+init_db()
 
 
 # ================= FUNCTIONS =================
 def add_order(table_id, section_id, item, qty=1, is_parcel=False):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Get price from menu table
-    cur.execute("SELECT price FROM menu WHERE name=?", (item,))
-    result = cur.fetchone()
-    price = result[0] if result else 0
+    conn = get_conn()
+    cur = conn.cursor()
     is_parcel_int = 1 if is_parcel else 0
 
-    cur.execute(
-        "INSERT INTO orders (table_id, section_id, item, qty, status, created_at, price, is_parcel) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (table_id, section_id, item, qty, "Preparing", timestamp, price, is_parcel_int)
-    )
-    conn.commit()
+    with get_write_lock():
+        # created_at is stamped by SQLite (spelled out because older databases have no column
+        # default) and the price is looked up from the menu inside the same statement
+        cur.execute(
+            "INSERT INTO orders (table_id, section_id, item, qty, status, created_at, price, is_parcel) "
+            "VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'), COALESCE((SELECT price FROM menu WHERE name=?), 0), ?)",
+            (table_id, section_id, item, qty, "Preparing", item, is_parcel_int)
+        )
+        conn.commit()
 
-def get_orders(table_id=None, section_id=None, status=None, items=None):
-    query = "SELECT id, table_id, section_id, item, qty, status, created_at, price, is_parcel FROM orders WHERE 1=1"
-    params = []
-    if table_id:
+def get_db_version():
+    # Moves on every commit: data_version catches other connections and processes,
+    # total_changes catches this app's own writes (all of which go through the writer).
+    # total_changes already moves before a write commits, so read the pair under the
+    # write lock: every writer holds it until after conn.commit()
+    conn = get_conn()
+    with get_write_lock():
+        return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+# Result cache shared by all sessions; a new version simply misses and re-reads
+@st.cache_data(ttl=60, max_entries=256)
+def _cached_query(sql, params, version):
+    with read_conn() as conn:
+        return conn.execute(sql, params).fetchall()
+
+# Orders saved without a price fall back to the current menu price, the same way in the
+# rows and in the totals
+ORDER_PRICE = "COALESCE(price, (SELECT menu.price FROM menu WHERE menu.name = orders.item), 0)"
+ORDER_COLUMNS = f"id, table_id, section_id, item, qty, status, created_at, {ORDER_PRICE}, is_parcel"
+KITCHEN_COLUMNS = "id, table_id, section_id, item, qty, status, created_at, is_parcel"
+
+def _orders_sql(columns, n_status, has_items, by_table, by_section, limited, active_only=False):
+    query = f"SELECT {columns} FROM orders WHERE 1=1"
+    if by_table:
         query += " AND table_id=?"
-        params.append(table_id)
-    if section_id:
+    if by_section:
         query += " AND section_id=?"
-        params.append(section_id)
-    if status:
-        if isinstance(status, list):
-            if status:
-                placeholders = ",".join("?" for _ in status)
-                query += f" AND status IN ({placeholders})"
-                params.extend(status)
-            else:
-                # if list is empty, return no results
-                query += " AND 1=0"
-        else:
-            query += " AND status=?"
-            params.append(status)
-    
-    if items: # if items is not None and not an empty list
-        placeholders = ",".join("?" for _ in items)
-        query += f" AND item IN ({placeholders})"
-        params.extend(items)
-
+    if active_only:
+        # Spelled out literally: SQLite only uses the partial idx_orders_active when the
+        # query's WHERE visibly matches the index's, which bound parameters never do
+        query += " AND status IN ('Preparing','Ready')"
+    elif n_status:
+        placeholders = ",".join("?" * n_status)
+        query += f" AND status IN ({placeholders})"
+    if has_items:
+        # One JSON array parameter, so the SQL text stays the same however many items
+        # are selected and sqlite3's statement cache keeps reusing the prepared query
+        query += " AND item IN (SELECT value FROM json_each(?))"
     query += " ORDER BY created_at DESC"
-    cur.execute(query, tuple(params))
-    return cur.fetchall()
-
-def get_new_section_id(table_id):
-    cur.execute("SELECT MAX(section_id) FROM orders WHERE table_id=?", (table_id,))
-    max_id = cur.fetchone()[0]
-    return (max_id or 0) + 1
+    if limited:
+        query += " LIMIT ?"
+    return query
+
+def get_orders(table_id=None, section_id=None, status=None, items=None, limit=None, columns=ORDER_COLUMNS):
+    # An empty status list (every status deselected) matches nothing, so skip the query
+    if isinstance(status, list) and not status:
+        return []
+    if status and not isinstance(status, list):
+        status = [status]
+    status = status or []
+    items = items or []
+    active_only = sorted(status) == sorted(ACTIVE_STATUSES)
+    sql = _orders_sql(columns, n_status=len(status), has_items=bool(items), by_table=bool(table_id),
+                      by_section=bool(section_id), limited=bool(limit), active_only=active_only)
+    params = [p for p in (table_id, section_id) if p] + ([] if active_only else status)
+    if items:
+        params.append(json.dumps(items))
+    if limit:
+        params.append(limit)
+    return _cached_query(sql, tuple(params), get_db_version())
+
+def get_kitchen_orders(status, items, limit=KITCHEN_ORDER_LIMIT):
+    # The Kitchen view never shows prices, so leave that column out
+    return get_orders(status=status, items=items, limit=limit, columns=KITCHEN_COLUMNS)
+
+@st.cache_data(ttl=60, max_entries=256)
+def _table_orders(table_id, version):
+    # Rows and section totals from one read transaction, so a section added by another
+    # session between the two SELECTs can never show up in one and not the other
+    orders_sql = _orders_sql(ORDER_COLUMNS, n_status=0, has_items=False, by_table=True, by_section=False, limited=False)
+    totals_sql = f"SELECT section_id, SUM(qty * {ORDER_PRICE}) FROM orders WHERE table_id=? GROUP BY section_id"
+    with read_conn() as conn:
+        conn.execute("BEGIN")
+        try:
+            rows = conn.execute(orders_sql, (table_id,)).fetchall()
+            totals = dict(conn.execute(totals_sql, (table_id,)).fetchall())
+        finally:
+            conn.rollback()
+    return rows, totals
+
+def get_table_view(table_id):
+    # Reuse the last snapshot of this table until the database changes
+    version = get_db_version()
+    key = (table_id, version)
+    if st.session_state.get("table_view_key") != key:
+        orders, section_totals = _table_orders(table_id, version)
+        sections = defaultdict(list)
+        for order in orders:
+            sections[order[2]].append(order) # order[2] is section_id
+        # Sorted by section once here, so the views can iterate it as-is
+        st.session_state.table_view = (dict(sorted(sections.items())), section_totals, sum(section_totals.values()))
+        st.session_state.table_view_key = key
+    return st.session_state.table_view
 
 def update_qty(order_id, change):
-    cur.execute("SELECT qty FROM orders WHERE id=?", (order_id,))
-    row = cur.fetchone()
-    if row:
-        qty = row[0] + change
-        if qty <= 0:
+    conn = get_conn()
+    cur = conn.cursor()
+    with get_write_lock():
+        # Single atomic read-modify-write; needs SQLite >= 3.35 for RETURNING
+        cur.execute("UPDATE orders SET qty = qty + ? WHERE id=? RETURNING qty", (change, order_id))
+        row = cur.fetchone()
+        if row and row[0] <= 0:
             cur.execute("DELETE FROM orders WHERE id=?", (order_id,))
-        else:
-            cur.execute("UPDATE orders SET qty=? WHERE id=?", (qty, order_id))
         conn.commit()
-        st.rerun()
 
 def update_status(order_id, status):
-    cur.execute("UPDATE orders SET status=? WHERE id=?", (status, order_id))
-    conn.commit()
-    st.rerun()
+    conn = get_conn()
+    cur = conn.cursor()
+    with get_write_lock():
+        cur.execute("UPDATE orders SET status=? WHERE id=?", (status, order_id))
+        conn.commit()
 
 def delete_order(order_id):
-    cur.execute("DELETE FROM orders WHERE id=?", (order_id,))
-    conn.commit()
-    st.rerun()
+    conn = get_conn()
+    cur = conn.cursor()
+    with get_write_lock():
+        cur.execute("DELETE FROM orders WHERE id=?", (order_id,))
+        conn.commit()
 
 def delete_section(table_id, section_id):
-    cur.execute("DELETE FROM orders WHERE table_id=? AND section_id=?", (table_id, section_id))
-    conn.commit()
-    st.rerun()
+    conn = get_conn()
+    cur = conn.cursor()
+    with get_write_lock():
+        cur.execute("DELETE FROM orders WHERE table_id=? AND section_id=?", (table_id, section_id))
+        conn.commit()
 
 def toggle_parcel_status(order_id):
-    cur.execute("UPDATE orders SET is_parcel = NOT is_parcel WHERE id=?", (order_id,))
-    conn.commit()
-    st.rerun()
+    conn = get_conn()
+    cur = conn.cursor()
+    with get_write_lock():
+        cur.execute("UPDATE orders SET is_parcel = NOT is_parcel WHERE id=?", (order_id,))
+        conn.commit()
 
 # --- Menu CRUD ---
-def get_menu_items():
-    cur.execute("SELECT id, name, price FROM menu ORDER BY name")
-    return cur.fetchall()
+# Keyed by the full get_db_version(): our own menu writes never move data_version, so a
+# read racing another session's commit could otherwise re-cache the old menu under a
+# key that stays current. The explicit clears just drop entries that can no longer hit
+@st.cache_data(ttl=60)
+def get_menu_items(version):
+    with read_conn() as conn:
+        return conn.execute("SELECT id, name, price FROM menu ORDER BY name").fetchall()
+
+@st.cache_data(ttl=60)
+def get_menu_prices(version):
+    return {name: price for _, name, price in get_menu_items(version)}
+
+def clear_menu_cache():
+    get_menu_items.clear()
+    get_menu_prices.clear()
 
 def add_menu_item(name, price):
-    try:
-        cur.execute("INSERT INTO menu (name, price) VALUES (?, ?)", (name, price))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        st.error(f"Error: Item '{name}' already exists in the menu.")
-        return False
+    conn = get_conn()
+    cur = conn.cursor()
+    with get_write_lock():
+        try:
+            cur.execute("INSERT INTO menu (name, price) VALUES (?, ?)", (name, price))
+            conn.commit()
+            clear_menu_cache()
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            st.error(f"Error: Item '{name}' already exists in the menu.")
+            return False
 
 def update_menu_item(item_id, name, price):
-    try:
-        cur.execute("UPDATE menu SET name=?, price=? WHERE id=?", (name, price, item_id))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        st.error(f"Error: An item with name '{name}' may already exist.")
-        return False
+    conn = get_conn()
+    cur = conn.cursor()
+    with get_write_lock():
+        try:
+            cur.execute("UPDATE menu SET name=?, price=? WHERE id=?", (name, price, item_id))
+            conn.commit()
+            clear_menu_cache()
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            st.error(f"Error: An item with name '{name}' may already exist.")
+            return False
 
 def delete_menu_item(item_id):
-    cur.execute("DELETE FROM menu WHERE id=?", (item_id,))
-    conn.commit()
+    conn = get_conn()
+    cur = conn.cursor()
+    with get_write_lock():
+        cur.execute("DELETE FROM menu WHERE id=?", (item_id,))
+        conn.commit()
+        clear_menu_cache()
 
 
 
@@ -195,55 +358,55 @@ if "selected_table" not in st.session_state:
 # ================= UI =================
 st.set_page_config(page_title="Restaurant Order Manager", layout="wide", initial_sidebar_state="collapsed")
 st.title("🍽️ Restaurant Order Manager")
+st.markdown(ORDER_CSS, unsafe_allow_html=True)
 
 # View switcher
 view = st.sidebar.radio("Switch View", ["Waiter", "Kitchen", "Configuration"], 0)
 
+# --- Menu lookups shared by all views, loaded once per rerun ---
+menu_version = get_db_version()
+menu_rows = get_menu_items(menu_version)
+menu_prices_dict = get_menu_prices(menu_version)
+item_names = sorted(menu_prices_dict.keys())
+
 # ================= WAITER VIEW =================
 if view == "Waiter":
     st.sidebar.header("Waiter Controls")
-    if st.sidebar.checkbox("Auto-refresh", value=True):
-        st_autorefresh(interval=5000, key="waiter_refresh")
+    auto_refresh = st.sidebar.checkbox("Auto-refresh", value=True)
 
     # --- Table Selection ---
     st.subheader("Select a Table")
-    table_options = [str(i) for i in range(1, NUM_TABLES + 1)] # Changed to string for st.radio labels
+    table_options = list(range(1, NUM_TABLES + 1))
     
     # Use st.radio for responsive table selection
-    selected_table_str = st.radio(
+    st.session_state.selected_table = st.radio(
         "Choose Table", 
         table_options, 
         index=st.session_state.selected_table - 1, 
         horizontal=True,
         key="table_selector" # Added a key for st.radio
     )
-    st.session_state.selected_table = int(selected_table_str) # Convert back to int
     st.divider() # Add a divider for visual separation
-    st.subheader("Current Orders")
-
-
-    # --- Get all orders for the table and group by section ---
-    table_orders = get_orders(table_id=st.session_state.selected_table)
-    sections = defaultdict(list)
-    for order in table_orders:
-        sections[order[2]].append(order) # order[2] is section_id
 
-    # --- Create a price lookup dictionary ---
-    menu_prices_dict = {name: price for _, name, price in get_menu_items()}
 
     # --- Menu and Ordering ---
     with st.expander("Add New Item", expanded=False):
         col1, col2, col3, col4 = st.columns([2, 1, 2, 2])
         with col1:
-            menu_item_names = [""] + sorted(list(menu_prices_dict.keys()))
+            menu_item_names = [""] + item_names
             selected_item = st.selectbox("Select an item", menu_item_names)
         with col2:
             quantity = st.number_input("Quantity", min_value=1, value=1)
             is_parcel_add = st.checkbox("🛍️", key="add_parcel")
         with col3:
-            existing_sections = sorted(sections.keys())
-            section_options = [f"Section {s}" for s in existing_sections] + ["Create New Section"]
-            selected_section_str = st.selectbox("Choose Section", options=section_options)
+            # Same snapshot the orders panel renders from, so no separate query
+            existing_sections = list(get_table_view(st.session_state.selected_table)[0])
+            # Options are the section ids themselves (None = new section); labels come from format_func
+            selected_section = st.selectbox(
+                "Choose Section",
+                options=existing_sections + [None],
+                format_func=lambda s: "Create New Section" if s is None else f"Section {s}"
+            )
 
         with col4:
             st.write("")
@@ -252,97 +415,89 @@ if view == "Waiter":
                 if selected_item == "":
                     st.warning("Please select an item.")
                 else:
-                    if selected_section_str == "Create New Section":
-                        target_section = get_new_section_id(st.session_state.selected_table)
+                    if selected_section is None:
+                        # Section ids were already loaded for the selectbox in this run
+                        target_section = max(existing_sections, default=0) + 1
                     else:
-                        target_section = int(selected_section_str.split(" ")[1])
+                        target_section = selected_section
 
                     add_order(st.session_state.selected_table, target_section, selected_item, quantity, is_parcel=is_parcel_add)
-                    st.success(f"Added {quantity} x {selected_item} to Table {st.session_state.selected_table}, {selected_section_str}")
+                    st.success(f"Added {quantity} x {selected_item} to Table {st.session_state.selected_table}, Section {target_section}")
                     st.rerun()
 
-    st.subheader("Current Orders")
-    if not sections:
-        st.info("No orders for this table yet.")
-    else:
-        # Calculate grand total for all sections first
-        grand_total = 0
-        for section_id, orders in sorted(sections.items()):
-            section_total_sum = sum(order[7] * order[4] for order in orders if order[7] is not None)
-            grand_total += section_total_sum
-        
-        # Iterate through sections and display each as an expander
-        for section_id, orders in sorted(sections.items()):
-            with st.expander(f"**Section {section_id}**"):
-                with st.container(border=True): # Use container for consistent styling
-                    c1, c2 = st.columns([0.85, 0.15])
-                    with c1:
-                        st.markdown(f"**Section {section_id}**")
-                    with c2:
-                        st.button(
-                            "❌", 
-                            key=f"del_sec_{section_id}", 
-                            on_click=delete_section, 
-                            args=(st.session_state.selected_table, section_id),
-                            help="Delete this entire section"
-                        )
-
-                    section_total_display = 0 
-                    for o in orders: # Use 'orders' directly for the current section
-                        order_id, _, _, item, qty, status, _, price, is_parcel = o
-                        if price is None:
-                            price = menu_prices_dict.get(item, 0)
-                        total_price = qty * price
-                        section_total_display += total_price
-
-                        with st.container(border=False):
-                            c1, c2, c3, c4 = st.columns([3, 2, 2, 2])
-                            with c1:
-                                st.markdown(f"<p style='font-size:18px;'><b>{item}</b> {'🛍️' if is_parcel else ''}</p>", unsafe_allow_html=True)
-                                st.markdown(f"<p style='font-size:12px; color:grey;'>Price: ₹{price:.2f} | Total: ₹{total_price:.2f}</p>", unsafe_allow_html=True)
+    # --- Orders panel: only this part reruns on auto-refresh ---
+    @st.fragment(run_every=REFRESH_SECONDS if auto_refresh else None)
+    def orders_panel(table_id):
+        # --- Get all orders for the table, grouped by section, with totals ---
+        sections, section_totals, grand_total = get_table_view(table_id)
+
+        st.subheader("Current Orders")
+        if not sections:
+            st.info("No orders for this table yet.")
+        else:
+            # Iterate through sections and display each as an expander
+            for section_id, orders in sections.items():
+                with st.expander(f"**Section {section_id}**"):
+                    with st.container(border=True): # Use container for consistent styling
+                        c1, c2 = st.columns([0.85, 0.15])
+                        with c1:
+                            st.markdown(f"**Section {section_id}**")
+                        with c2:
+                            st.button(
+                                "❌", 
+                                key=f"del_sec_{section_id}", 
+                                on_click=delete_section, 
+                                args=(table_id, section_id),
+                                help="Delete this entire section"
+                            )
+
+                        for o in orders: # Use 'orders' directly for the current section
+                            order_id, _, _, item, qty, status, _, price, is_parcel = o
+                            total_price = qty * price
+
+                            with st.container(border=False):
+                                c1, c2, c3, c4 = st.columns([3, 2, 2, 2])
+                                with c1:
+                                    st.markdown(f"<p class='order-item'>{item} {'🛍️' if is_parcel else ''}</p>", unsafe_allow_html=True)
+                                    st.markdown(f"<p class='order-meta'>Price: ₹{price:.2f} | Total: ₹{total_price:.2f}</p>", unsafe_allow_html=True)
                             
-                            with c2:
-                                disable_qty_buttons = (status == "Served")
-                                # Use columns directly within c2 for better stacking on mobile
-                                qty_col1, qty_col2, qty_col3 = st.columns([1, 2, 1]) 
-                                with qty_col1:
-                                    if st.button("➖", key=f"dec_{order_id}", use_container_width=True, disabled=disable_qty_buttons):
-                                        if not disable_qty_buttons:
-                                            update_qty(order_id, -1)
-                                with qty_col2:
-                                    st.markdown(f"<div style='text-align: center; padding-top: 0px; font-size:18px;'><b>`{qty}`</b></div>", unsafe_allow_html=True)
-                                with qty_col3:
-                                    if st.button("➕", key=f"inc_{order_id}", use_container_width=True, disabled=disable_qty_buttons):
-                                        if not disable_qty_buttons:
-                                            update_qty(order_id, 1)
-
-                            with c3:
-                                if status == "Preparing":
-                                    st.markdown("<p style='color:orange; font-size:18px;'><b>Preparing</b></p>", unsafe_allow_html=True)
-                                elif status == "Ready":
-                                    st.button("Mark as Served", key=f"serve_{order_id}", on_click=update_status, args=(order_id, "Served"), use_container_width=True, type="primary")
-                                else:
-                                    st.markdown("<p style='color:lightgreen; font-size:18px;'><b>Served</b></p>", unsafe_allow_html=True)
+                                with c2:
+                                    disable_qty_buttons = (status == "Served")
+                                    # Use columns directly within c2 for better stacking on mobile
+                                    qty_col1, qty_col2, qty_col3 = st.columns([1, 2, 1]) 
+                                    with qty_col1:
+                                        st.button("➖", key=f"dec_{order_id}", on_click=update_qty, args=(order_id, -1), use_container_width=True, disabled=disable_qty_buttons)
+                                    with qty_col2:
+                                        st.markdown(f"<div class='order-qty'>`{qty}`</div>", unsafe_allow_html=True)
+                                    with qty_col3:
+                                        st.button("➕", key=f"inc_{order_id}", on_click=update_qty, args=(order_id, 1), use_container_width=True, disabled=disable_qty_buttons)
+
+                                with c3:
+                                    if status == "Preparing":
+                                        st.markdown("<p class='status-prep'>Preparing</p>", unsafe_allow_html=True)
+                                    elif status == "Ready":
+                                        st.button("Mark as Served", key=f"serve_{order_id}", on_click=update_status, args=(order_id, "Served"), use_container_width=True, type="primary")
+                                    else:
+                                        st.markdown("<p class='status-served'>Served</p>", unsafe_allow_html=True)
                             
-                            with c4:
-                                if status != "Served":
-                                    disable_buttons = (status == "Served")
-                                    col_parcel, col_delete = st.columns(2) # Create two columns for the buttons
-                                    with col_parcel:
-                                        if st.button("🛍️", key=f"parcel_{order_id}", help="Toggle Parcel Status", disabled=disable_buttons, use_container_width=True):
-                                            if not disable_buttons:
-                                                toggle_parcel_status(order_id)
-                                    with col_delete:
-                                        if st.button("🗑️", key=f"del_{order_id}", use_container_width=True, help="Delete this item"):
-                                            delete_order(order_id)
-                        st.divider()
-
-
-                    st.markdown(f"<h5 style='text-align: right;'>Section Total: ₹{section_total_display:.2f}</h5>", unsafe_allow_html=True)
+                                with c4:
+                                    if status != "Served":
+                                        disable_buttons = (status == "Served")
+                                        col_parcel, col_delete = st.columns(2) # Create two columns for the buttons
+                                        with col_parcel:
+                                            st.button("🛍️", key=f"parcel_{order_id}", on_click=toggle_parcel_status, args=(order_id,), help="Toggle Parcel Status", disabled=disable_buttons, use_container_width=True)
+                                        with col_delete:
+                                            st.button("🗑️", key=f"del_{order_id}", on_click=delete_order, args=(order_id,), use_container_width=True, help="Delete this item")
+                            st.divider()
+
+
+                        st.markdown(f"<h5 class='total'>Section Total: ₹{section_totals[section_id]:.2f}</h5>", unsafe_allow_html=True)
                 
-        if grand_total > 0:
-            st.markdown("---")
-            st.markdown(f"<h3 style='text-align: right;'>Grand Total: ₹{grand_total:.2f}</h3>", unsafe_allow_html=True)
+            if grand_total > 0:
+                st.markdown("---")
+                st.markdown(f"<h3 class='total'>Grand Total: ₹{grand_total:.2f}</h3>", unsafe_allow_html=True)
+
+    orders_panel(st.session_state.selected_table)
 
 
 # ================= KITCHEN VIEW =================
@@ -350,47 +505,51 @@ elif view == "Kitchen":
     st.header("🍳 Kitchen View")
     
     # --- Auto-refresh control ---
-    if st.sidebar.checkbox("Auto-refresh", value=True):
-        st_autorefresh(interval=5000, key="kitchen_refresh")
+    auto_refresh = st.sidebar.checkbox("Auto-refresh", value=True)
 
     # --- Order Filtering ---
     st.sidebar.header("Kitchen Filters")
-    filter_status = st.sidebar.multiselect("Filter by Status", ["Preparing", "Ready", "Served"], default=["Preparing", "Ready"])
+    filter_status = st.sidebar.multiselect("Filter by Status", ["Preparing", "Ready", "Served"], default=ACTIVE_STATUSES)
     
-    menu_items_db = get_menu_items()
-    item_names = sorted([item[1] for item in menu_items_db])
     filter_items = st.sidebar.multiselect("Filter by Food Item", item_names)
 
-    # --- Display Orders in Columns ---
-    all_orders = get_orders(status=filter_status, items=filter_items)
-    
-    SECTION_EMOJIS = ["🔴", "🔵", "🟢", "🟡", "🟣", "🟠", "⚪", "⚫"]
+    # --- Display Orders in Columns: only this part reruns on auto-refresh ---
+    @st.fragment(run_every=REFRESH_SECONDS if auto_refresh else None)
+    def kitchen_orders(filter_status, filter_items):
+        all_orders = get_kitchen_orders(filter_status, filter_items)
 
-    if not all_orders:
-        st.warning("No orders with selected filters.")
-    else:
-        num_columns = 2 # Changed for better mobile responsiveness
-        cols = st.columns(num_columns)
-        for i, o in enumerate(all_orders):
-            order_id, table_id, section_id, item, qty, status, created_at, _, is_parcel = o
-            with cols[i % num_columns].container(border=True):
-                emoji = SECTION_EMOJIS[section_id % len(SECTION_EMOJIS)]
-
-                if is_parcel:
-                    st.markdown("### 🛍️ PARCEL")
-
-                st.markdown(f"**Table {table_id} | Section {section_id} {emoji}**")
-                st.markdown(f"### **{qty} x {item}**")
-                st.caption(f"Ordered at: {created_at}")
+        if not all_orders:
+            st.warning("No orders with selected filters.")
+        else:
+            if len(all_orders) == KITCHEN_ORDER_LIMIT:
+                st.warning(f"Showing only the newest {KITCHEN_ORDER_LIMIT} orders; older ones are hidden. Narrow the filters to see them.")
+            num_columns = 2 # Changed for better mobile responsiveness
+            cols = st.columns(num_columns)
+            # Deal the orders into one list per column, then fill each column in one go
+            buckets = [all_orders[c::num_columns] for c in range(num_columns)]
+            for col, bucket in zip(cols, buckets):
+                with col:
+                    for o in bucket:
+                        order_id, table_id, section_id, item, qty, status, created_at, is_parcel = o
+                        with st.container(border=True):
+                            emoji = SECTION_EMOJIS[section_id % len(SECTION_EMOJIS)]
+
+                            if is_parcel:
+                                st.markdown("### 🛍️ PARCEL")
+
+                            st.markdown(f"**Table {table_id} | Section {section_id} {emoji}**")
+                            st.markdown(f"### **{qty} x {item}**")
+                            st.caption(f"Ordered at: {created_at}")
                 
-                if status == "Preparing":
-                    st.markdown("<p style='color:orange; font-size:18px;'><b>Status: Preparing...</b></p>", unsafe_allow_html=True)
-                    if st.button("Mark as Ready", key=f"kitchen_ready_{order_id}", use_container_width=True, type="primary"):
-                        update_status(order_id, "Ready")
-                elif status == "Ready":
-                    st.markdown("<p style='color:yellow; font-size:18px;'><b>Status: ✅Ready</b></p>", unsafe_allow_html=True)
-                else: 
-                    st.markdown("<p style='color:lightgreen; font-size:18px;'><b>Status: Served</b></p>", unsafe_allow_html=True)
+                            if status == "Preparing":
+                                st.markdown("<p class='status-prep'>Status: Preparing...</p>", unsafe_allow_html=True)
+                                st.button("Mark as Ready", key=f"kitchen_ready_{order_id}", on_click=update_status, args=(order_id, "Ready"), use_container_width=True, type="primary")
+                            elif status == "Ready":
+                                st.markdown("<p class='status-ready'>Status: ✅Ready</p>", unsafe_allow_html=True)
+                            else: 
+                                st.markdown("<p class='status-served'>Status: Served</p>", unsafe_allow_html=True)
+
+    kitchen_orders(filter_status, filter_items)
 
 # ================= CONFIGURATION VIEW =================
 elif view == "Configuration":
@@ -413,13 +572,12 @@ elif view == "Configuration":
 
     st.subheader("Existing Menu Items")
     
-    menu_items = get_menu_items()
-    if not menu_items:
+    if not menu_rows:
         st.info("No items in the menu. Add one above.")
     else:
         num_columns = 2 # Match Kitchen view responsiveness
         cols = st.columns(num_columns)
-        for i, (item_id, name, price) in enumerate(menu_items):
+        for i, (item_id, name, price) in enumerate(menu_rows):
             with cols[i % num_columns].container(border=True):
                 st.markdown(f"#### {name}")
                 st.markdown(f"**Price:** ₹{price:.2f}")
@@ -427,9 +585,7 @@ elif view == "Configuration":
                 # Action buttons
                 col_del, col_edit_exp = st.columns([1,1])
                 with col_del:
-                    if st.button("Delete Item", key=f"cfg_del_{item_id}", use_container_width=True): # Changed key to avoid conflicts
-                        delete_menu_item(item_id)
-                        st.rerun()
+                    st.button("Delete Item", key=f"cfg_del_{item_id}", on_click=delete_menu_item, args=(item_id,), use_container_width=True) # Changed key to avoid conflicts
                 
                 with col_edit_exp:
                     # The Edit Expander will be placed here
@@ -438,7 +594,10 @@ elif view == "Configuration":
                             edited_name = st.text_input("Item Name", value=name, key=f"cfg_edit_name_{item_id}")
                             edited_price = st.number_input("Price", value=price, min_value=0.0, format="%.2f", key=f"cfg_edit_price_{item_id}")
                             if st.form_submit_button("Save Changes", type="primary", use_container_width=True):
-                                if update_menu_item(item_id, edited_name, edited_price):
+                                # Skip the write (and the cache invalidation) when nothing was edited
+                                if (edited_name, edited_price) == (name, price):
+                                    st.info("No changes to save.")
+                                elif update_menu_item(item_id, edited_name, edited_price):
                                     st.success(f"Updated '{edited_name}'.")
                                     st.rerun()
     
\ No newline at end of file